@@ -159,6 +159,15 @@ sed -i "s/\\\$r2a_cdr_database/$r2a_cdr_database/g; \
         s/\\\$r2a_cdr_user/$r2a_cdr_user/g" ring2all_cdr.sql
 sudo -u postgres psql -f ring2all_cdr.sql
 
+# Partition the cdr table and create the hourly rollups
+echo -e "************************************************************"
+echo -e "*          Partition cdr table and create rollups          *"
+echo -e "************************************************************"
+wget -O ring2all_cdr_partitioning.sql https://raw.githubusercontent.com/VitalPBX/freeswitch/main/sql/ring2all_cdr_partitioning.sql
+sed -i "s/\\\$r2a_cdr_database/$r2a_cdr_database/g; \
+        s/\\\$r2a_cdr_user/$r2a_cdr_user/g" ring2all_cdr_partitioning.sql
+sudo -u postgres psql -f ring2all_cdr_partitioning.sql
+
 # Download and Install FreeSWITCH
 echo -e "************************************************************"
 echo -e "*          Installing FreeSWITCH version 1.10.12           *"
@@ -316,7 +325,13 @@ wget -O sip_profiles_migrate_to_db.py https://raw.githubusercontent.com/VitalPBX
 wget -O conference.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/conference/conference.py
 wget -O callcenter.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/callcenter/callcenter.py
 wget -O voicemail_profile.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/voicemail/voicemail_profile.py
+wget -O voicemail_storage.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/voicemail/voicemail_storage.py
 wget -O global_vars.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/global_vars/global_vars.py
+wget -O global_vars_refresh.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/global_vars/global_vars_refresh.py
+wget -O cdr_maintenance.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/cdr/cdr_maintenance.py
+wget -O cdr_export.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/cdr/cdr_export.py
+wget -O odbc_dsn.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/odbc_dsn.py
+wget -O blacklist_import.py https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/migration/blacklist/blacklist_import.py
 
 # Lua Files
 wget -O main.lua https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/lua/main.lua
@@ -327,6 +342,7 @@ wget -O dialplan.lua https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/
 wget -O sip_profiles.lua https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/lua/main/xml_handler/sip_profiles/sip_profiles.lua
 wget -O ivr.lua https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/lua/main/xml_handler/ivr/ivr.lua
 wget -O tenant_vars.lua https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/lua/resources/utils/tenant_vars.lua
+wget -O call_block_index.lua https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/lua/resources/utils/call_block_index.lua
 wget -O global_vars.lua https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/lua/main/xml_handler/global_vars/global_vars.lua
 wget -O lua.conf.xml https://raw.githubusercontent.com/VitalPBX/freeswitch/refs/heads/main/etc/freeswitch/autoload_configs/lua.conf.xml
 
@@ -410,6 +426,7 @@ mv index.lua /usr/share/freeswitch/scripts/main/xml_handlers/index.lua
 mv global_vars.lua /usr/share/freeswitch/scripts/main/xml_handlers/global_vars.lua
 mv settings.lua /usr/share/freeswitch/scripts/resources/settings/settings.lua
 mv tenant_vars.lua /usr/share/freeswitch/scripts/resources/utils/tenant_vars.lua
+mv call_block_index.lua /usr/share/freeswitch/scripts/resources/utils/call_block_index.lua
 
 # Create Lua Script for management user registration (directory)
 echo -e "************************************************************"
@@ -523,6 +540,33 @@ WHERE field = '\${sip_refer_to}'
     SELECT id FROM core.dialplan_extensions WHERE name ILIKE '%park%'
   );"
 
+# Install the CDR maintenance job (future partitions, hourly rollups, old partitions)
+echo -e "************************************************************"
+echo -e "*            Install CDR partition maintenance job         *"
+echo -e "************************************************************"
+mkdir -p /etc/ring2all
+mv cdr_maintenance.py /etc/ring2all/cdr_maintenance.py
+chmod +x /etc/ring2all/cdr_maintenance.py
+cat << EOF > /etc/cron.d/ring2all-cdr
+# Ring2All CDR maintenance: create partitions ahead, refresh hourly rollups, detach old partitions
+*/5 * * * * root /usr/bin/python3 /etc/ring2all/cdr_maintenance.py maintain >> /var/log/ring2all-cdr.log 2>&1
+30 3 1 * * root /usr/bin/python3 /etc/ring2all/cdr_maintenance.py detach --keep 12 >> /var/log/ring2all-cdr.log 2>&1
+EOF
+chmod 644 /etc/cron.d/ring2all-cdr
+/usr/bin/python3 /etc/ring2all/cdr_maintenance.py maintain
+
+# Install the tenant variable map refresh job (rebuilds maps marked stale by changes to core.global_vars)
+echo -e "************************************************************"
+echo -e "*          Install tenant variable map refresh job         *"
+echo -e "************************************************************"
+mv global_vars_refresh.py /etc/ring2all/global_vars_refresh.py
+chmod +x /etc/ring2all/global_vars_refresh.py
+cat << EOF > /etc/cron.d/ring2all-vars
+# Ring2All tenant variable maps: rebuild the maps of tenants whose global variables changed
+* * * * * root /usr/bin/python3 /etc/ring2all/global_vars_refresh.py >> /var/log/ring2all-vars.log 2>&1
+EOF
+chmod 644 /etc/cron.d/ring2all-vars
+
 # Restart Freeswitch Service
 echo -e "************************************************************"
 echo -e "*                 Restart Freeswitch Service               *"
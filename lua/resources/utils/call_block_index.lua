@@ -0,0 +1,103 @@
+-- call_block_index.lua
+-- Per-call lookup in the block list index compiled by migration/blacklist/blacklist_import.py.
+-- The index is a sorted file of fixed-width records "<lo><hi>\n" (KEY_WIDTH bytes each, space padded),
+-- so a lookup is a binary search over the file instead of a LIKE query per call.
+
+-- Usage:
+--   local call_block_index = require("resources.utils.call_block_index")
+--   if call_block_index.is_blocked(tenant_id, session:getVariable("caller_id_number"), "blacklist", "inbound") then
+--       session:hangup("CALL_REJECTED")
+--   end
+
+local M = {}  -- Module table
+
+local INDEX_DIR = "/var/lib/ring2all/call_block"
+local KEY_WIDTH = 24                      -- Must match KEY_WIDTH in blacklist_import.py
+local RECORD_SIZE = KEY_WIDTH * 2 + 1     -- lo + hi + newline
+
+-- Direction used when none is given; "all" / "both" entries are compiled into every direction
+local DEFAULT_SCOPE = { blacklist = "inbound", call_block = "incoming" }
+
+-- Internal function to log messages with a standard prefix
+-- @param level string - Logging level (e.g., "INFO", "ERR")
+-- @param msg string - Message to log
+local function log(level, msg)
+    freeswitch.consoleLog(level, "[call_block_index] " .. msg .. "\n")
+end
+
+-- Reduce a number to the key format used by the index (digits only, space padded)
+-- @param number string - Number as dialed or presented (e.g., "+1 (900) 555-0100")
+-- @return string|nil - Padded key, or nil if the number cannot be indexed
+local function make_key(number)
+    local digits = tostring(number or ""):gsub("%D", "")
+    if digits == "" or #digits > KEY_WIDTH then
+        return nil
+    end
+    return digits .. string.rep(" ", KEY_WIDTH - #digits)
+end
+
+-- Public function: Default index path for a tenant, table and scope
+-- Must match index_path() in blacklist_import.py
+-- @param tenant_id string - The UUID of the tenant
+-- @param tbl string|nil - "blacklist" (default) or "call_block"
+-- @param scope string|nil - Lookup direction: inbound / outbound (blacklist) or incoming / outgoing (call_block)
+-- @return string - Path of the index file
+function M.path(tenant_id, tbl, scope)
+    tbl = tbl or "blacklist"
+    scope = scope or DEFAULT_SCOPE[tbl]
+    return INDEX_DIR .. "/" .. tbl .. "_" .. scope .. "_" .. tostring(tenant_id) .. ".idx"
+end
+
+-- Public function: Check whether a number falls inside any range of an index file
+-- @param path string - Index file written by blacklist_import.py
+-- @param number string - Number to check
+-- @return boolean - true if the number or one of its prefixes is listed
+function M.lookup(path, number)
+    local key = make_key(number)
+    if not key then
+        return false
+    end
+
+    local f = io.open(path, "rb")
+    if not f then
+        log("WARNING", "Index " .. path .. " not found, number not checked")
+        return false
+    end
+
+    -- Find the last record whose lo <= key, then check key <= hi
+    local low, high = 0, math.floor(f:seek("end") / RECORD_SIZE) - 1
+    local found = false
+    while low <= high do
+        local mid = math.floor((low + high) / 2)
+        f:seek("set", mid * RECORD_SIZE)
+        local record = f:read(RECORD_SIZE - 1)
+        local lo, hi = record:sub(1, KEY_WIDTH), record:sub(KEY_WIDTH + 1)
+        if key < lo then
+            high = mid - 1
+        elseif key > hi then
+            low = mid + 1
+        else
+            found = true
+            break
+        end
+    end
+
+    f:close()
+    return found
+end
+
+-- Public function: Check a number against the tenant's default index
+-- @param tenant_id string - The UUID of the tenant
+-- @param number string - Number to check
+-- @param tbl string|nil - "blacklist" (default) or "call_block"
+-- @param scope string|nil - Lookup direction: inbound / outbound (blacklist) or incoming / outgoing (call_block)
+-- @return boolean - true if the number is blocked
+function M.is_blocked(tenant_id, number, tbl, scope)
+    local blocked = M.lookup(M.path(tenant_id, tbl, scope), number)
+    if blocked then
+        log("INFO", "Number " .. tostring(number) .. " is blocked for tenant " .. tostring(tenant_id))
+    end
+    return blocked
+end
+
+return M
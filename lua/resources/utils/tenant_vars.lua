@@ -1,6 +1,10 @@
 -- tenant_vars.lua
 -- Utility module to load tenant-specific global variables from PostgreSQL (via ODBC)
 -- and apply them to the current call session in FreeSWITCH.
+-- A tenant's variables are the global ones (tenant_id IS NULL) with its own rows on top. They are
+-- read from the pre-expanded map in core.tenant_var_maps, or built from core.global_vars the same
+-- way while that map is missing or stale. $${name} references to FreeSWITCH built-ins are expanded
+-- with freeswitch.getGlobalVariable in both cases.
 
 -- Usage:
 --   local tenant_vars = require("resources.utils.tenant_vars")
@@ -67,7 +71,56 @@ local function resolve_tenant_id(domain)
     return tenant_id
 end
 
--- Load all global variables associated with a specific tenant from the database
+-- Expand $${name} references like global_vars_refresh.py does: names defined in raw are expanded
+-- recursively, any other name is a FreeSWITCH built-in read with getGlobalVariable.
+-- Variables in a reference cycle, or referring to an unset built-in, are left out.
+-- @param raw table - Variable name-value pairs, possibly holding $${name} references
+-- @return table - A table of resolved variable name-value pairs
+local function expand_vars(raw)
+    local resolved, failed, visiting = {}, {}, {}
+
+    local function resolve(name)
+        if resolved[name] or failed[name] then
+            return resolved[name]
+        end
+        if visiting[name] then
+            log("ERR", "❌ Variable cycle through $$" .. name .. ", leaving it unset")
+            return nil
+        end
+        visiting[name] = true
+
+        local complete = true
+        local value = raw[name]:gsub("%$%${([^}]+)}", function(ref)
+            local ref_value
+            if raw[ref] ~= nil then
+                ref_value = resolve(ref)
+            else
+                ref_value = freeswitch.getGlobalVariable(ref)
+            end
+            if ref_value == nil then
+                complete = false
+                return nil  -- keep the reference; the variable is left out below
+            end
+            return ref_value
+        end)
+
+        visiting[name] = nil
+        if not complete then
+            log("WARNING", "?? Variable $$" .. name .. " references an unset variable, leaving it unset")
+            failed[name] = true
+            return nil
+        end
+        resolved[name] = value
+        return value
+    end
+
+    for name in pairs(raw) do
+        resolve(name)
+    end
+    return resolved
+end
+
+-- Load the variables of a tenant merged over the global scope, unexpanded
 -- @param tenant_id string - The UUID of the tenant
 -- @return table - A table of variable name-value pairs
 local function load_vars(tenant_id)
@@ -78,9 +131,11 @@ local function load_vars(tenant_id)
         return vars
     end
 
+    -- Global rows first, so the tenant's own rows override them
     local sql = string.format([[ 
         SELECT name, value FROM core.global_vars
-        WHERE enabled = TRUE AND tenant_id = '%s'
+        WHERE enabled = TRUE AND (tenant_id IS NULL OR tenant_id = '%s')
+        ORDER BY tenant_id NULLS FIRST
     ]], tenant_id)
 
     dbh:query(sql, function(row)
@@ -91,25 +146,78 @@ local function load_vars(tenant_id)
     return vars
 end
 
+-- Load the pre-expanded variable map of a tenant (core.tenant_var_maps, written by
+-- global_vars_refresh.py) with a single keyed query that also resolves the tenant.
+-- Maps marked stale by a change to core.global_vars are ignored until they are rebuilt.
+-- If domain is nil or "main", the tenant with is_main = TRUE is used.
+-- @param domain string|nil - Domain name (or nil to use main tenant)
+-- @return table|nil - A table of variable name-value pairs (built-in references unexpanded),
+--                      or nil if no current map exists
+local function load_var_map(domain)
+    local dbh = freeswitch.Dbh("odbc://ring2all")
+    if not dbh then
+        log("ERR", "❌ Cannot connect to database to load tenant variables")
+        return nil
+    end
+
+    local tenant_filter
+    if not domain or domain == "main" then
+        tenant_filter = "t.is_main = TRUE"
+    else
+        tenant_filter = string.format("t.domain_name = '%s'", (domain:gsub("'", "''")))
+    end
+
+    local sql = string.format([[
+        SELECT e.key AS name, e.value AS value
+        FROM core.tenants t
+        JOIN core.tenant_var_maps m ON m.tenant_id = t.id
+        CROSS JOIN LATERAL jsonb_each_text(m.vars) e
+        WHERE %s AND t.enabled = TRUE AND m.stale = FALSE
+    ]], tenant_filter)
+
+    local vars = nil
+    dbh:query(sql, function(row)
+        vars = vars or {}
+        vars[row.name] = row.value
+    end)
+
+    dbh:release()
+    return vars
+end
+
+-- Load the expanded variables of a tenant: from its map when current, otherwise from core.global_vars
+-- @param domain string|nil - Domain name (or nil to use main tenant)
+-- @return table|nil - A table of resolved variable name-value pairs, or nil if the tenant is not found
+local function load_tenant_vars(domain)
+    local map = load_var_map(domain)
+    if map then
+        return expand_vars(map)
+    end
+
+    -- The map is missing or stale (rebuilt by the ring2all-vars cron job): build it at call time
+    log("NOTICE", "?? No current variable map for domain " .. tostring(domain) .. ", expanding at call time")
+    local tenant_id = resolve_tenant_id(domain)
+    if not tenant_id then
+        return nil
+    end
+    return expand_vars(load_vars(tenant_id))
+end
+
 -- Public function: Apply all variables for a specific tenant to the current session
 -- @param session object - The FreeSWITCH session object (or a simulated session)
 -- @param domain string - Domain name used to resolve the tenant
 function M.apply(session, domain)
     log("INFO", "?? Applying tenant vars for domain: " .. tostring(domain))
 
-    local tenant_id = resolve_tenant_id(domain)
-
-    if not tenant_id then
+    local vars = load_tenant_vars(domain)
+    if not vars then
         log("WARNING", "?? No tenant found for domain: " .. tostring(domain))
         return
     end
 
-    local vars = load_vars(tenant_id)
     local count = 0
-
     for name, value in pairs(vars) do
-        local resolved_value = replace_vars(value, vars)
-        session:setVariable(name, resolved_value)
+        session:setVariable(name, value)
         count = count + 1
     end
 
@@ -125,9 +233,9 @@ function M.replace_vars(str, vars)
 end
 
 -- Public function: Utility to load vars directly (for other modules like sip_profiles.lua)
+-- Returns the same expanded global + tenant variables that M.apply sets, or {} if the tenant is not found
 function M.load_vars(domain)
-    local tenant_id = resolve_tenant_id(domain)
-    return load_vars(tenant_id or "")
+    return load_tenant_vars(domain) or {}
 end
 
 return M
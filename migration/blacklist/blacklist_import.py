@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+# Imports large do-not-call / block lists from CSV into core.blacklist or core.call_block and
+# compiles a sorted range index of the tenant's blocked numbers and prefixes for per-call lookups.
+#
+# - The CSV is streamed into a temporary staging table with COPY; nothing is held in memory.
+# - Refreshes are differential: rows of the same list that disappeared from the CSV are deleted,
+#   new ones are inserted, and unchanged rows are left alone. A list is identified by --list
+#   (stored in the source column of either table); re-importing it with another --scope moves
+#   its existing rows to that scope.
+# - Values are reduced to digits. A trailing '*' (or --prefixes) marks a prefix.
+# - The index is a file of fixed-width records "<lo><hi>\n", sorted and with overlapping ranges
+#   merged, so lua/resources/utils/call_block_index.lua can binary-search it without loading it.
+#   There is one index per lookup direction; after an import every direction whose entries may
+#   have changed is recompiled (both for --scope all / both).
+#
+# Usage:
+#   blacklist_import.py dnc_2025-06-01.csv --list national_dnc
+#   blacklist_import.py premium.csv --list premium --table call_block --prefixes --scope outgoing
+#   blacklist_import.py --index-only --table blacklist
+
+import argparse
+import csv
+import os
+import re
+import sys
+
+import psycopg2
+
+# odbc_dsn.py sits next to this script once installed, and in migration/ in the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from odbc_dsn import ODBC_INI, load_odbc_dsn
+
+# Configuration
+ODBC_DSN = "ring2all"
+INDEX_DIR = "/var/lib/ring2all/call_block"
+KEY_WIDTH = 24          # Longest number stored in the index; must match call_block_index.lua
+FETCH_SIZE = 50000      # Rows fetched per round trip while compiling the index
+
+# Lookup directions an index is compiled for, and the scope value that covers all of them
+DIRECTIONS = {"blacklist": ("inbound", "outbound"), "call_block": ("incoming", "outgoing")}
+ALL_SCOPE = {"blacklist": "all", "call_block": "both"}
+
+NON_DIGITS = re.compile(r"[^0-9]")
+
+# Turn a CSV cell into (digits, 'number' | 'prefix'), or None if it holds no digits
+def normalize(raw, all_prefixes):
+    raw = raw.strip()
+    digits = NON_DIGITS.sub("", raw)
+    if not digits or len(digits) > KEY_WIDTH:
+        return None
+    kind = "prefix" if all_prefixes or raw.endswith("*") else "number"
+    return digits, kind
+
+# File-like object feeding COPY from a generator of text lines
+class LineStream:
+    def __init__(self, lines):
+        self.lines = lines
+        self.pending = b""
+
+    def read(self, size=-1):
+        parts = [self.pending]
+        length = len(self.pending)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            data = line.encode("utf-8")
+            parts.append(data)
+            length += len(data)
+        data = b"".join(parts)
+        if size < 0:
+            size = len(data)
+        self.pending = data[size:]
+        return data[:size]
+
+# Yield COPY text rows ("value\ttype\n") from the CSV file
+def csv_rows(path, column, has_header, all_prefixes, stats):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        index = 0
+        if has_header:
+            header = next(reader, [])
+            index = header.index(column) if column in header else int(column)
+        elif column:
+            index = int(column)
+
+        for row in reader:
+            if len(row) <= index:
+                stats["skipped"] += 1
+                continue
+            entry = normalize(row[index], all_prefixes)
+            if not entry:
+                stats["skipped"] += 1
+                continue
+            stats["read"] += 1
+            yield f"{entry[0]}\t{entry[1]}\n"
+
+# Differential refresh statements per target table
+REFRESH_SQL = {
+    "blacklist": {
+        "scopes": """
+            SELECT DISTINCT scope FROM core.blacklist WHERE tenant_id = %(tenant)s AND source = %(list)s
+        """,
+        "rescope": """
+            UPDATE core.blacklist SET scope = %(scope)s
+            WHERE tenant_id = %(tenant)s AND source = %(list)s AND scope IS DISTINCT FROM %(scope)s
+        """,
+        "delete": """
+            DELETE FROM core.blacklist b
+            WHERE b.tenant_id = %(tenant)s AND b.source = %(list)s
+              AND NOT EXISTS (SELECT 1 FROM import_stage s WHERE s.value = b.value AND s.type = b.type)
+        """,
+        "insert": """
+            INSERT INTO core.blacklist (tenant_id, type, value, description, source, scope)
+            SELECT %(tenant)s, s.type, s.value, %(description)s, %(list)s, %(scope)s
+            FROM (SELECT DISTINCT value, type FROM import_stage) s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM core.blacklist b
+                WHERE b.tenant_id = %(tenant)s AND b.source = %(list)s
+                  AND b.value = s.value AND b.type = s.type
+            )
+        """,
+    },
+    "call_block": {
+        "scopes": """
+            SELECT DISTINCT block_type FROM core.call_block
+            WHERE tenant_id = %(tenant)s AND user_id IS NULL AND source = %(list)s
+        """,
+        "rescope": """
+            UPDATE core.call_block SET block_type = %(scope)s
+            WHERE tenant_id = %(tenant)s AND user_id IS NULL AND source = %(list)s
+              AND block_type IS DISTINCT FROM %(scope)s
+        """,
+        "delete": """
+            DELETE FROM core.call_block c
+            WHERE c.tenant_id = %(tenant)s AND c.user_id IS NULL AND c.source = %(list)s
+              AND NOT EXISTS (
+                  SELECT 1 FROM import_stage s
+                  WHERE s.value || CASE s.type WHEN 'prefix' THEN '*' ELSE '' END = c.number_pattern
+              )
+        """,
+        "insert": """
+            INSERT INTO core.call_block (tenant_id, number_pattern, block_type, reason, source)
+            SELECT %(tenant)s, s.pattern, %(scope)s, %(description)s, %(list)s
+            FROM (
+                SELECT DISTINCT value || CASE type WHEN 'prefix' THEN '*' ELSE '' END AS pattern
+                FROM import_stage
+            ) s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM core.call_block c
+                WHERE c.tenant_id = %(tenant)s AND c.user_id IS NULL AND c.source = %(list)s
+                  AND c.number_pattern = s.pattern
+            )
+        """,
+    },
+}
+
+# Enabled entries of the tenant as (digits, type), in byte order. Non-digits are stripped
+# the same way normalize() does, so manual entries such as '+1 900-555...' are indexed too.
+INDEX_SQL = {
+    "blacklist": """
+        SELECT regexp_replace(value, '[^0-9]', '', 'g') AS digits,
+               CASE WHEN type = 'prefix' OR value LIKE '%%*' THEN 'prefix' ELSE 'number' END AS type
+        FROM core.blacklist
+        WHERE tenant_id = %(tenant)s AND enabled = TRUE
+          AND type IN ('number', 'prefix') AND scope IN (%(scope)s, 'all')
+        ORDER BY regexp_replace(value, '[^0-9]', '', 'g') COLLATE "C"
+    """,
+    "call_block": """
+        SELECT regexp_replace(number_pattern, '[^0-9]', '', 'g') AS digits,
+               CASE WHEN number_pattern LIKE '%%*' THEN 'prefix' ELSE 'number' END AS type
+        FROM core.call_block
+        WHERE tenant_id = %(tenant)s AND user_id IS NULL AND enabled = TRUE
+          AND block_type IN (%(scope)s, 'both')
+        ORDER BY regexp_replace(number_pattern, '[^0-9]', '', 'g') COLLATE "C"
+    """,
+}
+
+# Default index file for a table, direction and tenant; must match M.path() in call_block_index.lua
+def index_path(table, direction, tenant_id):
+    return os.path.join(INDEX_DIR, f"{table}_{direction}_{tenant_id}.idx")
+
+# Lookup directions whose index covers entries with any of the given scopes
+def affected_directions(table, scopes):
+    directions = set()
+    for scope in scopes:
+        if scope == ALL_SCOPE[table]:
+            directions.update(DIRECTIONS[table])
+        elif scope in DIRECTIONS[table]:
+            directions.add(scope)
+    return [d for d in DIRECTIONS[table] if d in directions]
+
+# Stream the CSV into the staging table and apply the differential refresh in one transaction.
+# Returns the scopes the list's entries had before and after the refresh.
+def import_list(conn, args, tenant_id):
+    stats = {"read": 0, "skipped": 0}
+    params = {
+        "tenant": tenant_id, "list": args.list, "scope": args.scope,
+        "description": args.description or f"Imported from {os.path.basename(args.csv)}",
+    }
+    with conn.cursor() as cursor:
+        cursor.execute("CREATE TEMP TABLE import_stage (value TEXT NOT NULL, type TEXT NOT NULL) ON COMMIT DROP")
+        stream = LineStream(csv_rows(args.csv, args.column, args.header, args.prefixes, stats))
+        cursor.copy_expert("COPY import_stage (value, type) FROM STDIN", stream, size=1024 * 1024)
+        cursor.execute("CREATE INDEX ON import_stage (value, type)")
+        cursor.execute("ANALYZE import_stage")
+
+        cursor.execute(REFRESH_SQL[args.table]["scopes"], params)
+        scopes = {row[0] for row in cursor.fetchall()} | {args.scope}
+        cursor.execute(REFRESH_SQL[args.table]["rescope"], params)
+        moved = cursor.rowcount
+        cursor.execute(REFRESH_SQL[args.table]["delete"], params)
+        removed = cursor.rowcount
+        cursor.execute(REFRESH_SQL[args.table]["insert"], params)
+        added = cursor.rowcount
+    conn.commit()
+
+    print(f"✅ List '{args.list}' refreshed in core.{args.table}: {stats['read']} entries read, "
+          f"{stats['skipped']} skipped, {added} added, {removed} removed, {moved} moved to scope '{args.scope}'.")
+    return scopes
+
+# Write the merged range table for the tenant; records are "<lo><hi>\n" padded to KEY_WIDTH.
+# Space sorts before every digit, so padding with spaces keeps the database order and
+# a prefix p covers exactly the keys between p + spaces and p + nines.
+def compile_index(conn, args, tenant_id, direction, path=None):
+    path = path or index_path(args.table, direction, tenant_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    ranges = 0
+    skipped = 0
+
+    with conn.cursor(name="blacklist_index") as cursor, open(tmp_path, "w", encoding="ascii") as out:
+        cursor.itersize = FETCH_SIZE
+        cursor.execute(INDEX_SQL[args.table], {"tenant": tenant_id, "scope": direction})
+
+        current = None
+        for value, kind in cursor:
+            if not value or len(value) > KEY_WIDTH:
+                skipped += 1
+                continue
+            lo = value.ljust(KEY_WIDTH)
+            hi = value.ljust(KEY_WIDTH, "9") if kind == "prefix" else lo
+            if current and lo <= current[1]:
+                current[1] = max(current[1], hi)
+                continue
+            if current:
+                out.write(current[0] + current[1] + "\n")
+                ranges += 1
+            current = [lo, hi]
+        if current:
+            out.write(current[0] + current[1] + "\n")
+            ranges += 1
+    conn.commit()
+
+    # Swap the file atomically so calls never read a half-written index
+    os.replace(tmp_path, path)
+    if skipped:
+        print(f"⚠️  {skipped} entries without digits or longer than {KEY_WIDTH} digits left out of the index")
+    print(f"✅ Index written to {path} ({ranges} ranges).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import block lists and compile the prefix index")
+    parser.add_argument("csv", nargs="?", help="CSV file with one number or prefix per row")
+    parser.add_argument("--list", default="import", help="Name identifying this list for differential refresh")
+    parser.add_argument("--table", choices=["blacklist", "call_block"], default="blacklist")
+    parser.add_argument("--tenant", default="Default", help="Tenant name")
+    parser.add_argument("--scope", help="blacklist scope: inbound (default), outbound or all; "
+                        "call_block block_type: incoming (default), outgoing or both")
+    parser.add_argument("--column", default="0", help="Column index, or header name with --header")
+    parser.add_argument("--header", action="store_true", help="The CSV has a header row")
+    parser.add_argument("--prefixes", action="store_true", help="Treat every entry as a prefix")
+    parser.add_argument("--description", help="Description stored on blacklist rows")
+    parser.add_argument("--index-only", action="store_true", help="Only recompile the index")
+    parser.add_argument("--index-out", help=f"Index file for a single-direction --scope "
+                        f"(default {INDEX_DIR}/<table>_<direction>_<tenant_id>.idx)")
+    parser.add_argument("--dsn", help=f"libpq connection string (default: DSN '{ODBC_DSN}' from {ODBC_INI})")
+    args = parser.parse_args()
+
+    if not args.csv and not args.index_only:
+        parser.error("a CSV file is required unless --index-only is given")
+    if not args.scope:
+        args.scope = DIRECTIONS[args.table][0]
+    if args.scope not in DIRECTIONS[args.table] + (ALL_SCOPE[args.table],):
+        parser.error(f"invalid --scope '{args.scope}' for table {args.table}")
+    if args.index_out and args.scope == ALL_SCOPE[args.table]:
+        parser.error(f"--index-out needs a single direction, not --scope {args.scope}")
+
+    conn_args = {"dsn": args.dsn} if args.dsn else load_odbc_dsn(ODBC_DSN)
+    conn = psycopg2.connect(**conn_args)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM core.tenants WHERE name = %s", (args.tenant,))
+            tenant_row = cursor.fetchone()
+        if not tenant_row:
+            raise Exception(f"❌ Tenant '{args.tenant}' not found")
+        tenant_id = tenant_row[0]
+
+        scopes = {args.scope}
+        if not args.index_only:
+            scopes = import_list(conn, args, tenant_id)
+        for direction in affected_directions(args.table, scopes):
+            path = args.index_out if direction == args.scope else None
+            compile_index(conn, args, tenant_id, direction, path)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Block list import failed: {e}")
+        raise SystemExit(1)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
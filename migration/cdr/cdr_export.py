@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+
+# Streams filtered CDR extracts from the ring2all_cdr database to compressed CSV or JSON Lines.
+# Rows are read through server-side (named) cursors in fixed-size chunks, so memory use does not
+# depend on the size of the result. Date ranges can be split across parallel workers; each worker
+# writes its own part file and the parts are concatenated in date order at the end.
+#
+# Usage:
+#   cdr_export.py --from 2025-01-01 --to 2025-02-01 --accountcode ACC123 -o jan.csv.gz
+#   cdr_export.py --from 2025-01-01 --to 2026-01-01 --destination-prefix 1900 \
+#                 --format jsonl --workers 6 -o premium.jsonl.gz
+
+import argparse
+import csv
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import psycopg2
+
+# odbc_dsn.py sits next to this script once installed, and in migration/ in the repository
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from odbc_dsn import ODBC_INI, load_odbc_dsn
+
+# Configuration
+ODBC_DSN = "ring2all_cdr"
+CHUNK_SIZE = 10000      # Rows fetched from the server per round trip
+
+COLUMNS = [
+    "id", "local_ip_v4", "caller_id_name", "caller_id_number", "destination_number", "context",
+    "start_stamp", "answer_stamp", "end_stamp", "duration", "billsec", "hangup_cause",
+    "uuid", "bleg_uuid", "accountcode", "read_codec", "write_codec"
+]
+
+# Build the WHERE clause and parameters shared by every date slice
+def build_filters(args):
+    clauses = []
+    params = []
+    if args.accountcode:
+        clauses.append("accountcode = %s")
+        params.append(args.accountcode)
+    if args.destination:
+        clauses.append("destination_number = %s")
+        params.append(args.destination)
+    if args.destination_prefix:
+        clauses.append("destination_number LIKE %s")
+        params.append(args.destination_prefix.replace("%", r"\%").replace("_", r"\_") + "%")
+    return clauses, params
+
+# Split [start, end) into consecutive slices of roughly equal length
+def split_range(start, end, parts):
+    step = (end - start) / parts
+    bounds = [start + step * i for i in range(parts)] + [end]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+def open_output(path, compress):
+    if compress:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+def format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+# Export one date slice to its own file and return the number of rows written
+def export_slice(dsn, where, params, start, end, path, fmt, compress, header, chunk_size):
+    conn = psycopg2.connect(**dsn)
+    rows = 0
+    try:
+        # Named cursor: rows stay on the server and are pulled chunk_size at a time
+        cursor = conn.cursor(name=f"cdr_export_{os.getpid()}")
+        cursor.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM cdr "
+            f"WHERE {' AND '.join(where + ['start_stamp >= %s', 'start_stamp < %s'])} "
+            "ORDER BY start_stamp, id",
+            params + [start, end]
+        )
+
+        with open_output(path, compress) as out:
+            writer = csv.writer(out) if fmt == "csv" else None
+            if writer and header:
+                writer.writerow(COLUMNS)
+
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                for row in chunk:
+                    values = [format_value(v) for v in row]
+                    if writer:
+                        writer.writerow(values)
+                    else:
+                        out.write(json.dumps(dict(zip(COLUMNS, values)), default=str) + "\n")
+                rows += len(chunk)
+
+        cursor.close()
+    finally:
+        conn.close()
+    return rows
+
+# Run all slices (in parallel if requested) and concatenate the parts in date order.
+# Concatenated gzip members form a valid gzip stream, so parts are merged as raw bytes.
+def export(args):
+    dsn = {"dsn": args.dsn} if args.dsn else load_odbc_dsn(ODBC_DSN)
+    where, params = build_filters(args)
+    compress = args.output.endswith(".gz")
+    slices = split_range(args.date_from, args.date_to, max(1, args.workers))
+
+    workdir = tempfile.mkdtemp(prefix="cdr_export_", dir=os.path.dirname(os.path.abspath(args.output)))
+    parts = [os.path.join(workdir, f"part_{i:04d}") for i in range(len(slices))]
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = [
+                pool.submit(export_slice, dsn, where, params, start, end, part,
+                            args.format, compress, i == 0, args.chunk_size)
+                for i, ((start, end), part) in enumerate(zip(slices, parts))
+            ]
+            total = 0
+            for (start, end), future in zip(slices, futures):
+                rows = future.result()
+                total += rows
+                print(f"   ➕ {start:%Y-%m-%d %H:%M} → {end:%Y-%m-%d %H:%M}: {rows} rows")
+
+        with open(args.output, "wb") as out:
+            for part in parts:
+                with open(part, "rb") as src:
+                    shutil.copyfileobj(src, out)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n✅ Export complete: {total} CDR rows written to {args.output}")
+
+def parse_date(value):
+    return datetime.fromisoformat(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream filtered CDR rows to compressed CSV or JSON Lines")
+    parser.add_argument("--from", dest="date_from", type=parse_date, required=True,
+                        help="Start of the range (inclusive), e.g. 2025-01-01")
+    parser.add_argument("--to", dest="date_to", type=parse_date, required=True,
+                        help="End of the range (exclusive), e.g. 2025-02-01")
+    parser.add_argument("--accountcode", help="Only rows with this account code")
+    parser.add_argument("--destination", help="Only rows with this exact destination_number")
+    parser.add_argument("--destination-prefix", help="Only rows whose destination_number starts with this")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="csv")
+    parser.add_argument("--workers", type=int, default=1, help="Parallel workers splitting the date range")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows fetched per round trip")
+    parser.add_argument("--dsn", help=f"libpq connection string (default: DSN '{ODBC_DSN}' from {ODBC_INI})")
+    parser.add_argument("-o", "--output", required=True, help="Output file; a .gz suffix enables gzip")
+    args = parser.parse_args()
+
+    if args.date_to <= args.date_from:
+        parser.error("--to must be later than --from")
+
+    try:
+        export(args)
+    except Exception as e:
+        print(f"❌ CDR export failed: {e}")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
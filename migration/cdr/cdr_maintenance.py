@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# CDR partition and rollup maintenance for the ring2all_cdr database.
+# Relies on the functions created by sql/ring2all_cdr_partitioning.sql.
+#
+# Usage:
+#   cdr_maintenance.py convert              # Convert cdr to monthly partitions (once)
+#   cdr_maintenance.py maintain             # Create future partitions and refresh hourly rollups
+#   cdr_maintenance.py detach --keep 12     # Detach partitions older than 12 months
+#
+# install.sh copies this script to /etc/ring2all/cdr_maintenance.py and registers
+# /etc/cron.d/ring2all-cdr, which runs 'maintain' every 5 minutes and 'detach' monthly.
+
+import argparse
+import pyodbc
+
+# Configuration
+ODBC_DSN = "ring2all_cdr"
+MONTHS_AHEAD = 3        # Partitions created ahead of the current month
+ROLLUP_BATCH = 100000   # cdr ids folded into the rollup per statement
+
+def convert(cursor, months_ahead):
+    cursor.execute("SELECT cdr_convert_to_partitioned(?)", (months_ahead,))
+    if cursor.fetchone()[0]:
+        print("✅ Table 'cdr' converted to monthly partitions (old rows kept in 'cdr_legacy').")
+    else:
+        print("➖ Table 'cdr' is already partitioned.")
+
+def maintain(cursor, months_ahead, batch):
+    cursor.execute("SELECT cdr_create_future_partitions(?)", (months_ahead,))
+    print(f"✅ Partitions ensured for the next {cursor.fetchone()[0]} months.")
+
+    cursor.execute("SELECT cdr_rollup_hourly_refresh(?)", (batch,))
+    print(f"✅ Hourly rollup refreshed: {cursor.fetchone()[0]} rollup rows written.")
+
+def detach(cursor, keep_months):
+    cursor.execute("SELECT cdr_detach_partitions(?)", (keep_months,))
+    detached = [row[0] for row in cursor.fetchall()]
+    for name in detached:
+        print(f"➖ Partition '{name}' detached.")
+    print(f"✅ {len(detached)} partitions detached.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain CDR partitions and hourly rollups")
+    parser.add_argument("action", choices=["convert", "maintain", "detach"])
+    parser.add_argument("--months-ahead", type=int, default=MONTHS_AHEAD,
+                        help="Monthly partitions to create ahead of the current month")
+    parser.add_argument("--batch", type=int, default=ROLLUP_BATCH,
+                        help="cdr ids aggregated per rollup statement")
+    parser.add_argument("--keep", type=int, default=12,
+                        help="Months of partitions kept attached by 'detach'")
+    args = parser.parse_args()
+
+    conn = pyodbc.connect(f"DSN={ODBC_DSN}")
+    cursor = conn.cursor()
+    try:
+        if args.action == "convert":
+            convert(cursor, args.months_ahead)
+        elif args.action == "maintain":
+            maintain(cursor, args.months_ahead, args.batch)
+        else:
+            detach(cursor, args.keep)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ CDR maintenance '{args.action}' failed: {e}")
+        raise SystemExit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import re
 import uuid
 import pyodbc
 from datetime import datetime
+from global_vars_refresh import refresh_tenant_var_maps
 
 # Configuration
 ODBC_DSN = "ring2all"
@@ -63,6 +64,11 @@ def migrate_global_vars(xml_path):
         conn.commit()
         print(f"\n✅ Migration complete: {inserted} global variables inserted.")
 
+        # Materialize the expanded per-tenant maps read by tenant_vars.lua
+        refreshed, _, failed = refresh_tenant_var_maps(cursor)
+        conn.commit()
+        print(f"✅ Tenant variable maps: {refreshed} refreshed, {failed} failed.")
+
     except Exception as e:
         print(f"❌ Error processing vars.xml: {e}")
 
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+
+# Materializes core.global_vars into one fully expanded variable map per tenant (core.tenant_var_maps).
+# Tenant variables override global ones, $${var} references are expanded, and reference cycles are
+# reported instead of stored. References to names not in core.global_vars (FreeSWITCH built-ins such
+# as $${local_ip_v4} or $${sounds_dir}) are kept as they are; tenant_vars.lua expands them with
+# freeswitch.getGlobalVariable when it applies the map.
+#
+# Any change to core.global_vars marks the affected maps stale (trg_mark_tenant_var_maps_stale) and
+# tenant_vars.lua builds the same map at call time until it is rebuilt. Only stale or missing maps
+# are rebuilt here; install.sh runs this every minute from /etc/cron.d/ring2all-vars.
+#
+# Usage:
+#   global_vars_refresh.py                  # Rebuild stale or missing maps
+#   global_vars_refresh.py --tenant Default # Rebuild a single tenant's map
+#   global_vars_refresh.py --force          # Rebuild every map even if unchanged
+
+import argparse
+import hashlib
+import json
+import re
+
+# Configuration
+ODBC_DSN = "ring2all"
+
+VAR_REF = re.compile(r"\$\$\{([^}]+)\}")
+
+class VarCycleError(Exception):
+    pass
+
+# Expand every $${name} in the raw map that names another variable of the map. References to
+# other names are FreeSWITCH built-ins and are left in place; a reference cycle raises VarCycleError.
+def expand_vars(raw):
+    resolved = {}
+    visiting = []
+
+    def resolve(name):
+        if name in resolved:
+            return resolved[name]
+        if name in visiting:
+            cycle = visiting[visiting.index(name):] + [name]
+            raise VarCycleError(" -> ".join(cycle))
+        visiting.append(name)
+
+        def substitute(match):
+            ref = match.group(1)
+            return resolve(ref) if ref in raw else match.group(0)
+
+        resolved[name] = VAR_REF.sub(substitute, raw[name])
+        visiting.pop()
+        return resolved[name]
+
+    for name in raw:
+        resolve(name)
+    return resolved
+
+# Fingerprint of the raw variables a tenant map is built from
+def source_hash(raw):
+    return hashlib.sha256(json.dumps(raw, sort_keys=True).encode("utf-8")).hexdigest()
+
+# Rebuild the maps that are stale or missing (every map with force, or only tenant_name).
+# Returns (refreshed, unchanged, failed) counts.
+def refresh_tenant_var_maps(cursor, tenant_name=None, force=False):
+    # Block the stale trigger until commit, so a variable changed while the maps are being
+    # rebuilt marks its map stale again afterwards instead of being lost
+    cursor.execute("LOCK TABLE core.tenant_var_maps IN SHARE ROW EXCLUSIVE MODE")
+
+    if tenant_name:
+        cursor.execute("SELECT id, name FROM core.tenants WHERE name = ? AND enabled = TRUE", (tenant_name,))
+    elif force:
+        cursor.execute("SELECT id, name FROM core.tenants WHERE enabled = TRUE")
+    else:
+        cursor.execute("""
+            SELECT t.id, t.name
+            FROM core.tenants t
+            LEFT JOIN core.tenant_var_maps m ON m.tenant_id = t.id
+            WHERE t.enabled = TRUE AND (m.tenant_id IS NULL OR m.stale = TRUE)
+        """)
+    tenants = cursor.fetchall()
+    if not tenants:
+        return 0, 0, 0
+
+    # Only the global scope and the variables of the tenants being rebuilt are loaded
+    ids = [str(tenant_id) for tenant_id, _ in tenants]
+    marks = ", ".join("?" for _ in ids)
+    cursor.execute(f"""
+        SELECT tenant_id, name, value FROM core.global_vars
+        WHERE enabled = TRUE AND (tenant_id IS NULL OR tenant_id IN ({marks}))
+    """, ids)
+    global_raw = {}
+    tenant_raw = {}
+    for tenant_id, name, value in cursor.fetchall():
+        if tenant_id is None:
+            global_raw[name] = value
+        else:
+            tenant_raw.setdefault(str(tenant_id), {})[name] = value
+
+    cursor.execute(f"SELECT tenant_id, source_hash FROM core.tenant_var_maps WHERE tenant_id IN ({marks})", ids)
+    stored = {str(row[0]): row[1] for row in cursor.fetchall()}
+
+    refreshed = unchanged = failed = 0
+    for tenant_id, name in tenants:
+        raw = dict(global_raw)
+        raw.update(tenant_raw.get(str(tenant_id), {}))
+        digest = source_hash(raw)
+
+        if not force and stored.get(str(tenant_id)) == digest:
+            # Marked stale by a change that did not alter the variables (e.g. a rewrite of the same value)
+            cursor.execute("UPDATE core.tenant_var_maps SET stale = FALSE WHERE tenant_id = ?", (str(tenant_id),))
+            unchanged += 1
+            continue
+
+        try:
+            expanded = expand_vars(raw)
+        except VarCycleError as e:
+            # The last good map stays in use (tenant_vars.lua leaves the cycle out when it has none)
+            cursor.execute("UPDATE core.tenant_var_maps SET stale = FALSE WHERE tenant_id = ?", (str(tenant_id),))
+            print(f"❌ Tenant '{name}': variable cycle {e}, keeping the previous map")
+            failed += 1
+            continue
+
+        cursor.execute("""
+            INSERT INTO core.tenant_var_maps (tenant_id, vars, version, source_hash, stale)
+            VALUES (?, CAST(? AS JSONB), 1, ?, FALSE)
+            ON CONFLICT (tenant_id) DO UPDATE SET
+                vars = EXCLUDED.vars,
+                version = core.tenant_var_maps.version + 1,
+                source_hash = EXCLUDED.source_hash,
+                stale = FALSE
+        """, (str(tenant_id), json.dumps(expanded, sort_keys=True), digest))
+        refreshed += 1
+        builtins = sum(1 for value in expanded.values() if VAR_REF.search(value))
+        print(f"✅ Tenant '{name}': {len(expanded)} variables materialized "
+              f"({builtins} with built-in references expanded at call time)")
+
+    return refreshed, unchanged, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize expanded global variables per tenant")
+    parser.add_argument("--tenant", help="Only refresh this tenant (by name)")
+    parser.add_argument("--force", action="store_true", help="Rewrite maps even if their variables did not change")
+    args = parser.parse_args()
+
+    # Imported here so expand_vars() can be used without the ODBC driver installed
+    import pyodbc
+    conn = pyodbc.connect(f"DSN={ODBC_DSN}")
+    cursor = conn.cursor()
+    try:
+        refreshed, unchanged, failed = refresh_tenant_var_maps(cursor, args.tenant, args.force)
+        conn.commit()
+        print(f"\n✅ Tenant variable maps: {refreshed} refreshed, {unchanged} unchanged, {failed} failed.")
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error refreshing tenant variable maps: {e}")
+        raise SystemExit(1)
+    finally:
+        cursor.close()
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Tests for the $${var} expansion used to build core.tenant_var_maps.
+#
+# Usage:
+#   python3 -m unittest test_global_vars_refresh.py   (from migration/global_vars)
+
+import re
+import unittest
+
+from global_vars_refresh import VarCycleError, expand_vars
+
+# Excerpt of the stock FreeSWITCH vars.xml
+VARS_XML = """
+<include>
+  <X-PRE-PROCESS cmd="set" data="default_password=1234"/>
+  <X-PRE-PROCESS cmd="set" data="sound_prefix=$${sounds_dir}/en/us/callie"/>
+  <X-PRE-PROCESS cmd="set" data="domain=$${local_ip_v4}"/>
+  <X-PRE-PROCESS cmd="set" data="domain_name=$${domain}"/>
+  <X-PRE-PROCESS cmd="set" data="hold_music=local_stream://moh"/>
+  <X-PRE-PROCESS cmd="set" data="use_profile=external"/>
+  <X-PRE-PROCESS cmd="set" data="rtp_sdes_suites=AEAD_AES_256_GCM_8|AES_CM_128_HMAC_SHA1_80"/>
+  <X-PRE-PROCESS cmd="set" data="global_codec_prefs=OPUS,G722,PCMU,PCMA"/>
+  <X-PRE-PROCESS cmd="set" data="outbound_codec_prefs=$${global_codec_prefs}"/>
+  <X-PRE-PROCESS cmd="set" data="xmpp_client_profile=xmppc"/>
+  <X-PRE-PROCESS cmd="set" data="bind_server_ip=auto"/>
+  <X-PRE-PROCESS cmd="set" data="external_rtp_ip=stun:stun.freeswitch.org"/>
+  <X-PRE-PROCESS cmd="set" data="internal_sip_port=5060"/>
+  <X-PRE-PROCESS cmd="set" data="presence_privacy=false"/>
+</include>
+"""
+
+# Same parsing as migrate_global_vars() in global_vars.py
+def parse_vars_xml(text):
+    raw = {}
+    for line in text.splitlines():
+        match = re.match(r'\s*<X-PRE-PROCESS cmd="set" data="(.*?)=(.*?)"\s*/?>', line)
+        if match:
+            raw[match.group(1).strip()] = match.group(2).strip()
+    return raw
+
+class ExpandVarsTest(unittest.TestCase):
+    def test_stock_vars_xml_keeps_builtin_references(self):
+        expanded = expand_vars(parse_vars_xml(VARS_XML))
+
+        # References to FreeSWITCH built-ins are kept for tenant_vars.lua, never emptied
+        self.assertEqual(expanded["sound_prefix"], "$${sounds_dir}/en/us/callie")
+        self.assertEqual(expanded["domain"], "$${local_ip_v4}")
+        self.assertEqual(expanded["domain_name"], "$${local_ip_v4}")
+
+        # References to other variables are expanded
+        self.assertEqual(expanded["outbound_codec_prefs"], "OPUS,G722,PCMU,PCMA")
+        self.assertEqual(expanded["hold_music"], "local_stream://moh")
+        self.assertEqual(set(expanded), set(parse_vars_xml(VARS_XML)))
+        self.assertNotIn("", expanded.values())
+
+    def test_tenant_overrides_are_kept(self):
+        raw = parse_vars_xml(VARS_XML)
+        raw["domain"] = "tenant1.example.com"                       # tenant variables overriding global ones
+        raw["sound_prefix"] = "$${sounds_dir}/es/mx/maria"
+
+        expanded = expand_vars(raw)
+        self.assertEqual(expanded["domain"], "tenant1.example.com")
+        self.assertEqual(expanded["domain_name"], "tenant1.example.com")
+        self.assertEqual(expanded["sound_prefix"], "$${sounds_dir}/es/mx/maria")
+
+    def test_builtin_reference_through_another_variable(self):
+        expanded = expand_vars({"b": "x$${a}", "a": "$${base_dir}/a", "c": "$${b}"})
+        self.assertEqual(expanded, {"a": "$${base_dir}/a", "b": "x$${base_dir}/a", "c": "x$${base_dir}/a"})
+
+    def test_cycle_is_reported(self):
+        with self.assertRaises(VarCycleError) as ctx:
+            expand_vars({"a": "$${b}", "b": "$${c}", "c": "$${a}", "d": "plain"})
+        self.assertEqual(str(ctx.exception), "a -> b -> c -> a")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+
+# Shared by the psycopg2-based scripts (cdr_export.py, blacklist_import.py): reads a DSN from
+# the odbc.ini written by install.sh and turns it into psycopg2.connect() keyword arguments.
+# Values are passed as separate arguments, so passwords with '%', spaces or quotes work as-is.
+#
+# Usage:
+#   conn = psycopg2.connect(**load_odbc_dsn("ring2all"))
+
+import configparser
+
+# Configuration
+ODBC_INI = "/etc/odbc.ini"
+
+# Connection keyword arguments for psycopg2.connect() from an odbc.ini section
+def load_odbc_dsn(section, path=ODBC_INI):
+    parser = configparser.ConfigParser(interpolation=None)
+    if not parser.read(path) or not parser.has_section(section):
+        raise Exception(f"❌ DSN '{section}' not found in {path}")
+    dsn = parser[section]
+    return {
+        "host": dsn.get("Servername", "127.0.0.1"),
+        "port": dsn.get("Port", "5432"),
+        "dbname": dsn.get("Database"),
+        "user": dsn.get("UserName"),
+        "password": dsn.get("Password"),
+    }
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+
+# Migrates the voicemail message store and call recordings to the Ring2All storage directories
+# and registers them in core.voicemail_messages and core.recordings.
+#
+# - Files are handled in batches: hashed and transferred by a thread pool, then registered in bulk.
+# - Transfers use hard links (--mode link) or kernel zero-copy (copy_file_range / sendfile).
+# - Files with the same SHA-256 are copied once; later duplicates are hard-linked to the first copy.
+# - Interrupted runs can be restarted: completed transfers are recorded in a manifest (source path,
+#   size, mtime), so those files are neither hashed nor copied again, and partial copies (*.part)
+#   resume from where they stopped.
+# - Folder, read state and caller ID of each msg_<uuid> file come from mod_voicemail's
+#   voicemail_msgs table (SQLite voicemail_<profile>.db, or the ODBC DSN given with --voicemail-odbc).
+#
+# Expected voicemail layout: <storage>/voicemail/<profile>/<domain>/<user>/msg_<uuid>.wav
+# Greetings and recorded names are transferred but not registered as messages.
+
+import argparse
+import errno
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import uuid
+import wave
+import pyodbc
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Configuration
+ODBC_DSN = "ring2all"
+VOICEMAIL_SRC = "/var/lib/freeswitch/storage/voicemail"
+RECORDINGS_SRC = "/var/lib/freeswitch/recordings"
+VOICEMAIL_DEST = "/var/lib/ring2all/voicemail"
+RECORDINGS_DEST = "/var/lib/ring2all/recordings"
+MANIFEST = "/var/lib/ring2all/storage_migration.manifest"
+VOICEMAIL_DB_DIR = "/var/lib/freeswitch/db"
+WORKERS = 8
+BATCH_SIZE = 1000
+HASH_CHUNK = 1024 * 1024
+MEDIA_EXTENSIONS = {".wav", ".mp3", ".ogg", ".opus", ".flac"}
+UUID_RE = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+# Connect to the database
+conn = pyodbc.connect(f"DSN={ODBC_DSN}")
+cursor = conn.cursor()
+cursor.fast_executemany = True
+
+# Retrieve tenant UUID for 'Default'
+cursor.execute("SELECT id FROM core.tenants WHERE name = 'Default'")
+tenant_row = cursor.fetchone()
+if not tenant_row:
+    raise Exception("❌ Tenant 'Default' not found")
+tenant_uuid = tenant_row[0]
+
+# Utility: current timestamp
+def now():
+    return datetime.utcnow()
+
+# Load lookups needed to map files to tenants and voicemail boxes
+def load_lookups():
+    cursor.execute("SELECT domain_name, id FROM core.tenants")
+    tenants = {row[0]: row[1] for row in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT u.tenant_id, u.username, v.id
+        FROM core.voicemail v
+        JOIN core.sip_users u ON u.id = v.sip_user_id
+    """)
+    boxes = {(str(row[0]), row[1]): row[2] for row in cursor.fetchall()}
+
+    # Files registered by a previous run, and the first file holding each content hash
+    registered = set()
+    hashes = {}
+    for table in ("core.voicemail_messages", "core.recordings"):
+        cursor.execute(f"SELECT file_path, content_hash FROM {table}")
+        for file_path, content_hash in cursor.fetchall():
+            registered.add(file_path)
+            if content_hash and os.path.exists(file_path):
+                hashes.setdefault(content_hash, file_path)
+
+    return tenants, boxes, registered, hashes
+
+# Completed transfers from previous runs: src -> (size, mtime_ns, dest, hash).
+# Lines are tab-separated and appended after each batch, so a crash loses at most one batch.
+def load_manifest(path):
+    manifest = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) == 5:
+                    manifest[fields[0]] = (int(fields[1]), int(fields[2]), fields[3], fields[4])
+    return manifest
+
+# True when src was transferred by a previous run and has not changed since
+# (entry holds the size and mtime taken by process_batch)
+def in_manifest(entry, manifest):
+    record = manifest.get(entry["src"])
+    if not record:
+        return False
+    return record[0] == entry["size"] and record[1] == entry["mtime_ns"] and record[2] == entry["dest"] \
+        and os.path.exists(record[2])
+
+# Reads message metadata from mod_voicemail's voicemail_msgs table
+class VoicemailMsgs:
+    def __init__(self, db_dir, odbc_dsn=None):
+        self.db_dir = db_dir
+        self.odbc_dsn = odbc_dsn
+        self.connections = {}
+
+    def _connect(self, profile):
+        key = self.odbc_dsn or profile
+        if key not in self.connections:
+            if self.odbc_dsn:
+                self.connections[key] = pyodbc.connect(f"DSN={self.odbc_dsn}")
+            else:
+                path = os.path.join(self.db_dir, f"voicemail_{profile}.db")
+                self.connections[key] = sqlite3.connect(f"file:{path}?mode=ro", uri=True) \
+                    if os.path.exists(path) else None
+        return self.connections[key]
+
+    # Metadata rows for the given message uuids of one profile, keyed by uuid
+    def lookup(self, profile, uuids):
+        db = self._connect(profile)
+        rows = {}
+        if not db or not uuids:
+            return rows
+        uuids = list(uuids)
+        for i in range(0, len(uuids), 500):
+            chunk = uuids[i:i + 500]
+            cur = db.cursor()
+            cur.execute(f"""
+                SELECT uuid, created_epoch, read_epoch, cid_name, cid_number, in_folder, flags
+                FROM voicemail_msgs WHERE uuid IN ({", ".join("?" * len(chunk))})
+            """, chunk)
+            for row in cur.fetchall():
+                rows[row[0]] = row
+            cur.close()
+        return rows
+
+    def close(self):
+        for db in self.connections.values():
+            if db:
+                db.close()
+
+# Walk the voicemail tree and yield one entry per media file
+def scan_voicemail(src_root, dest_root, tenants, boxes):
+    for dirpath, _, filenames in os.walk(src_root):
+        rel_dir = os.path.relpath(dirpath, src_root)
+        parts = rel_dir.split(os.sep)
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in MEDIA_EXTENSIONS:
+                continue
+            entry = {
+                "kind": "voicemail",
+                "src": os.path.join(dirpath, filename),
+                "dest": os.path.normpath(os.path.join(dest_root, rel_dir, filename)),
+                "voicemail_id": None,
+            }
+            # <profile>/<domain>/<user>/msg_*.wav
+            if len(parts) >= 3 and filename.startswith("msg_"):
+                message_uuid = UUID_RE.search(filename)
+                entry["profile"] = parts[0]
+                entry["message_uuid"] = message_uuid.group(0) if message_uuid else None
+                tenant_id = tenants.get(parts[1], tenant_uuid)
+                entry["tenant_id"] = tenant_id
+                entry["voicemail_id"] = boxes.get((str(tenant_id), parts[2]))
+                if not entry["voicemail_id"]:
+                    print(f"⚠️  No voicemail box for '{parts[2]}@{parts[1]}', {filename} will not be registered.")
+            yield entry
+
+# Walk the recordings tree and yield one entry per media file
+def scan_recordings(src_root, dest_root, tenants):
+    for dirpath, _, filenames in os.walk(src_root):
+        rel_dir = os.path.relpath(dirpath, src_root)
+        first = rel_dir.split(os.sep)[0]
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() not in MEDIA_EXTENSIONS:
+                continue
+            call_uuid = UUID_RE.search(filename)
+            yield {
+                "kind": "recording",
+                "src": os.path.join(dirpath, filename),
+                "dest": os.path.normpath(os.path.join(dest_root, rel_dir, filename)),
+                "tenant_id": tenants.get(first, tenant_uuid),
+                "call_uuid": call_uuid.group(0) if call_uuid else None,
+            }
+
+# SHA-256 of a file, read in large chunks
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Copy src to dst inside the kernel, starting at offset (for resumed copies)
+def zero_copy(src, dst, offset):
+    with open(src, "rb") as fin, os.fdopen(os.open(dst, os.O_WRONLY | os.O_CREAT, 0o644), "wb") as fout:
+        size = os.fstat(fin.fileno()).st_size
+        try:
+            while offset < size:
+                sent = os.copy_file_range(fin.fileno(), fout.fileno(), size - offset, offset, offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except (AttributeError, OSError) as e:
+            if isinstance(e, OSError) and e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                raise
+            # copy_file_range unavailable: fall back to sendfile, then to a buffered copy
+            os.lseek(fout.fileno(), offset, os.SEEK_SET)
+            try:
+                while offset < size:
+                    sent = os.sendfile(fout.fileno(), fin.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+            except OSError:
+                fin.seek(offset)
+                fout.seek(offset)
+                shutil.copyfileobj(fin, fout, HASH_CHUNK)
+        fout.flush()
+        os.fsync(fout.fileno())
+
+# Put the file at dest: hard link when requested, otherwise a resumable zero-copy transfer
+def transfer(src, dest, mode):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.exists(dest) and os.path.getsize(dest) == os.path.getsize(src):
+        return "exists"
+
+    if mode == "link":
+        try:
+            os.link(src, dest)
+            return "linked"
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+
+    part = dest + ".part"
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if offset > os.path.getsize(src):
+        os.remove(part)
+        offset = 0
+    zero_copy(src, part, offset)
+    shutil.copystat(src, part)
+    os.replace(part, dest)
+    return "resumed" if offset else "copied"
+
+# Link a duplicate to the first copy of the same content
+def link_duplicate(canonical, dest):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    if os.path.exists(dest):
+        return "exists"
+    try:
+        os.link(canonical, dest)
+        return "deduplicated"
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        return transfer(canonical, dest, "copy")
+
+# Duration in seconds for WAV files, None for other formats
+def media_duration(path):
+    try:
+        with wave.open(path, "rb") as w:
+            return int(round(w.getnframes() / float(w.getframerate())))
+    except (wave.Error, EOFError, OSError, ZeroDivisionError):
+        return None
+
+# Hash, transfer and register one batch of files
+def process_batch(batch, pool, mode, registered, hashes, manifest, manifest_file, vm_msgs, stats):
+    batch = [e for e in batch if e["dest"] not in registered]
+
+    # Files completed by an earlier run: reuse their hash, and skip them entirely
+    # unless they still need to be registered. A file that cannot be read (or was
+    # deleted by mod_voicemail meanwhile) is counted as failed and the batch goes on.
+    pending = []
+    for entry in batch:
+        try:
+            st = os.stat(entry["src"])
+        except OSError as e:
+            print(f"❌ Cannot read {entry['src']}: {e}")
+            stats["failed"] = stats.get("failed", 0) + 1
+            continue
+        entry["size"], entry["mtime_ns"] = st.st_size, st.st_mtime_ns
+        if in_manifest(entry, manifest):
+            record = manifest[entry["src"]]
+            if entry["kind"] == "voicemail" and not entry["voicemail_id"]:
+                stats["skipped"] = stats.get("skipped", 0) + 1
+                continue
+            entry["hash"] = record[3]
+        pending.append(entry)
+
+    to_hash = [e for e in pending if "hash" not in e]
+    for entry, content_hash in zip(to_hash, pool.map(_safe_hash, to_hash)):
+        if content_hash is None:
+            stats["failed"] = stats.get("failed", 0) + 1
+        entry["hash"] = content_hash
+    pending = [e for e in pending if e["hash"] is not None]
+    if not pending:
+        return
+
+    # The first file of each hash is transferred and becomes the canonical copy only once the
+    # transfer succeeds; files sharing its hash are linked to it. If the transfer fails, the next
+    # file with that hash is transferred in the following round instead.
+    done = []
+    while pending:
+        unique, duplicates, deferred, seen = [], [], [], set()
+        for entry in pending:
+            canonical = hashes.get(entry["hash"])
+            if canonical and canonical != entry["dest"]:
+                duplicates.append((entry, canonical))
+            elif entry["hash"] in seen:
+                deferred.append(entry)
+            else:
+                seen.add(entry["hash"])
+                unique.append(entry)
+
+        for entry, result in zip(unique, pool.map(lambda e: _safe(transfer, e["src"], e["dest"], mode), unique)):
+            stats[result] = stats.get(result, 0) + 1
+            if result != "failed":
+                hashes[entry["hash"]] = entry["dest"]
+                done.append(entry)
+        for (entry, canonical), result in zip(duplicates, pool.map(lambda d: _safe(link_duplicate, d[1], d[0]["dest"]), duplicates)):
+            stats[result] = stats.get(result, 0) + 1
+            if result != "failed":
+                done.append(entry)
+        pending = deferred
+
+    register(done, vm_msgs)
+    for entry in done:
+        registered.add(entry["dest"])
+        manifest[entry["src"]] = (entry["size"], entry["mtime_ns"], entry["dest"], entry["hash"])
+        manifest_file.write(f"{entry['src']}\t{entry['size']}\t{entry['mtime_ns']}\t{entry['dest']}\t{entry['hash']}\n")
+    manifest_file.flush()
+    os.fsync(manifest_file.fileno())
+
+# Hash a file, reporting unreadable files instead of aborting the whole batch
+def _safe_hash(entry):
+    try:
+        return file_hash(entry["src"])
+    except OSError as e:
+        print(f"❌ Hashing {entry['src']} failed: {e}")
+        return None
+
+# Run a transfer, reporting failures instead of aborting the whole batch
+def _safe(func, src, dest, *args):
+    try:
+        return func(src, dest, *args)
+    except OSError as e:
+        print(f"❌ Transfer of {src} to {dest} failed: {e}")
+        return "failed"
+
+# Epoch seconds from voicemail_msgs to a timestamp, None when unset
+def epoch_to_date(epoch):
+    return datetime.fromtimestamp(int(epoch), tz=timezone.utc) if epoch and int(epoch) > 0 else None
+
+# Insert metadata rows for a batch with a single executemany per table
+def register(entries, vm_msgs):
+    # voicemail_msgs rows for the messages in this batch, looked up per profile
+    by_profile = {}
+    for entry in entries:
+        if entry["kind"] == "voicemail" and entry.get("voicemail_id") and entry.get("message_uuid"):
+            by_profile.setdefault(entry["profile"], set()).add(entry["message_uuid"])
+    metadata = {}
+    for profile, uuids in by_profile.items():
+        metadata.update(vm_msgs.lookup(profile, uuids))
+
+    messages, recordings = [], []
+    missing = 0
+    for entry in entries:
+        fmt = os.path.splitext(entry["dest"])[1].lstrip(".").lower()
+        duration = media_duration(entry["dest"]) if fmt == "wav" else None
+        mtime = datetime.fromtimestamp(entry["mtime_ns"] / 1e9, tz=timezone.utc)
+        if entry["kind"] == "voicemail":
+            if not entry.get("voicemail_id"):
+                continue
+            meta = metadata.get(entry.get("message_uuid"))
+            if meta:
+                _, created_epoch, read_epoch, cid_name, cid_number, in_folder, flags = meta
+                # mod_voicemail keeps saved messages in the inbox with flags = 'save'
+                folder = "saved" if flags == "save" else (in_folder or "inbox")
+                received = epoch_to_date(created_epoch) or mtime
+                read_date = epoch_to_date(read_epoch)
+                enabled = flags != "delete"
+            else:
+                missing += 1
+                folder, received, read_date, cid_name, cid_number, enabled = "inbox", mtime, None, None, None, True
+            messages.append((
+                str(uuid.uuid4()), entry["voicemail_id"], entry["tenant_id"], entry.get("message_uuid"),
+                folder, entry["dest"], fmt, duration, entry["size"], entry["hash"],
+                cid_name, cid_number, received, read_date, enabled, now()
+            ))
+        else:
+            recordings.append((
+                str(uuid.uuid4()), entry["tenant_id"], entry["dest"], os.path.basename(entry["dest"]),
+                fmt, entry["call_uuid"], duration, entry["size"], entry["hash"], True, now()
+            ))
+
+    if messages:
+        cursor.executemany("""
+            INSERT INTO core.voicemail_messages (
+                id, voicemail_id, tenant_id, message_uuid, folder, file_path, file_format,
+                duration, size_bytes, content_hash, caller_id_name, caller_id_number,
+                received_date, read_date, enabled, insert_date
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, messages)
+    if recordings:
+        cursor.executemany("""
+            INSERT INTO core.recordings (
+                id, tenant_id, file_path, file_name, file_format, call_uuid,
+                duration, size_bytes, content_hash, enabled, insert_date
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, recordings)
+    conn.commit()
+    if missing:
+        print(f"⚠️  {missing} voicemail messages have no voicemail_msgs row, registered as unread inbox messages")
+    print(f"   ➕ Registered {len(messages)} voicemail messages and {len(recordings)} recordings")
+
+def migrate_storage(args):
+    tenants, boxes, registered, hashes = load_lookups()
+    manifest = load_manifest(args.manifest)
+    for size, mtime_ns, dest, content_hash in manifest.values():
+        if os.path.exists(dest):
+            hashes.setdefault(content_hash, dest)
+    vm_msgs = VoicemailMsgs(args.voicemail_db_dir, args.voicemail_odbc)
+    sources = []
+    if os.path.isdir(args.voicemail_src):
+        sources.append(scan_voicemail(args.voicemail_src, args.voicemail_dest, tenants, boxes))
+    else:
+        print(f"⚠️  Voicemail storage '{args.voicemail_src}' not found, skipping.")
+    if os.path.isdir(args.recordings_src):
+        sources.append(scan_recordings(args.recordings_src, args.recordings_dest, tenants))
+    else:
+        print(f"⚠️  Recordings directory '{args.recordings_src}' not found, skipping.")
+
+    stats = {}
+    os.makedirs(os.path.dirname(args.manifest), exist_ok=True)
+    with ThreadPoolExecutor(max_workers=args.workers) as pool, open(args.manifest, "a", encoding="utf-8") as manifest_file:
+        state = (registered, hashes, manifest, manifest_file, vm_msgs, stats)
+        for source in sources:
+            batch = []
+            for entry in source:
+                batch.append(entry)
+                if len(batch) >= args.batch_size:
+                    process_batch(batch, pool, args.mode, *state)
+                    batch = []
+            process_batch(batch, pool, args.mode, *state)
+    vm_msgs.close()
+
+    summary = ", ".join(f"{count} {result}" for result, count in sorted(stats.items())) or "nothing to do"
+    if stats.get("failed"):
+        print(f"\n⚠️  Storage migration finished with failures: {summary}. Run it again to retry them.")
+    else:
+        print(f"\n✅ Storage migration complete: {summary}.")
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate voicemail messages and recordings to Ring2All storage")
+    parser.add_argument("--mode", choices=["copy", "link"], default="copy",
+                        help="Hard-link files (same filesystem) or copy them")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Parallel hash/transfer workers")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Files registered per commit")
+    parser.add_argument("--voicemail-src", default=VOICEMAIL_SRC)
+    parser.add_argument("--voicemail-dest", default=VOICEMAIL_DEST)
+    parser.add_argument("--recordings-src", default=RECORDINGS_SRC)
+    parser.add_argument("--recordings-dest", default=RECORDINGS_DEST)
+    parser.add_argument("--manifest", default=MANIFEST, help="Record of completed transfers used to resume")
+    parser.add_argument("--voicemail-db-dir", default=VOICEMAIL_DB_DIR,
+                        help="Directory holding mod_voicemail's voicemail_<profile>.db files")
+    parser.add_argument("--voicemail-odbc", help="ODBC DSN of voicemail_msgs when mod_voicemail uses odbc-dsn")
+    args = parser.parse_args()
+
+    try:
+        stats = migrate_storage(args)
+    except Exception as e:
+        conn.rollback()
+        print(f"❌ Error migrating voicemail and recording storage: {e}")
+        return 1
+    return 1 if stats.get("failed") else 0
+
+exit_code = main()
+
+# Close connection
+cursor.close()
+conn.close()
+print("✅ Database connection closed.")
+raise SystemExit(exit_code)
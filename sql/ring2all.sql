@@ -377,6 +377,39 @@ CREATE INDEX idx_voicemail_tenant_id ON core.voicemail (tenant_id);         -- I
 CREATE INDEX idx_voicemail_insert_user ON core.voicemail (insert_user);     -- Index for querying creator
 CREATE INDEX idx_voicemail_update_user ON core.voicemail (update_user);     -- Index for querying updater
 
+-- ===========================
+-- Table: core.voicemail_messages
+-- Description: Voicemail messages stored for each voicemail box
+-- ===========================
+
+CREATE TABLE core.voicemail_messages (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),                       -- Unique identifier for the message
+    voicemail_id UUID NOT NULL REFERENCES core.voicemail(id) ON DELETE CASCADE, -- Voicemail box holding the message
+    tenant_id UUID NOT NULL REFERENCES core.tenants(id) ON DELETE CASCADE, -- Tenant that owns this message
+    message_uuid UUID,                                                    -- mod_voicemail message UUID (msg_<uuid>.wav)
+    folder TEXT NOT NULL DEFAULT 'inbox',                                 -- Folder of the message (e.g., inbox, saved)
+    file_path TEXT NOT NULL UNIQUE,                                       -- Absolute path to the message audio file
+    file_format TEXT DEFAULT 'wav',                                       -- Format of the audio file (e.g., wav, mp3)
+    duration INTEGER,                                                     -- Duration of the message in seconds
+    size_bytes BIGINT,                                                    -- Size of the file in bytes
+    content_hash TEXT,                                                    -- SHA-256 of the file content (deduplication)
+    caller_id_name TEXT,                                                  -- Caller ID name of the caller who left the message
+    caller_id_number TEXT,                                                -- Caller ID number of the caller who left the message
+    received_date TIMESTAMPTZ,                                            -- When the message was left
+    read_date TIMESTAMPTZ,                                                -- When the message was first listened to
+    enabled BOOLEAN NOT NULL DEFAULT TRUE,                                -- Whether the message is visible
+
+    insert_date TIMESTAMPTZ NOT NULL DEFAULT NOW(),                       -- Creation timestamp with timezone
+    insert_user UUID,                                                     -- UUID of the user who created the record
+    update_date TIMESTAMPTZ,                                              -- Last update timestamp
+    update_user UUID                                                      -- UUID of the user who last updated the record
+);
+
+-- Indexes for core.voicemail_messages
+CREATE INDEX idx_voicemail_messages_voicemail_id ON core.voicemail_messages (voicemail_id); -- Messages of a box
+CREATE INDEX idx_voicemail_messages_tenant_id ON core.voicemail_messages (tenant_id);       -- Filter by tenant
+CREATE INDEX idx_voicemail_messages_content_hash ON core.voicemail_messages (content_hash); -- Duplicate lookups
+
 -- =============================================
 -- Table: core.dialplan_contexts
 -- Description: Dialplan Contexts Table
@@ -935,6 +968,7 @@ CREATE TABLE core.recordings (
     direction TEXT DEFAULT 'inbound',                                    -- Direction: inbound, outbound, internal
     duration INTEGER,                                                    -- Duration of the recording in seconds
     size_bytes BIGINT,                                                   -- Size of the file in bytes
+    content_hash TEXT,                                                   -- SHA-256 of the file content (deduplication)
     transcription TEXT,                                                  -- Optional transcription text
     tags TEXT[],                                                         -- Optional array of tags or labels
     enabled BOOLEAN NOT NULL DEFAULT TRUE,                               -- Indicates if recording is accessible or archived
@@ -950,6 +984,8 @@ CREATE INDEX idx_recordings_tenant_id ON core.recordings (tenant_id);
 CREATE INDEX idx_recordings_user_id ON core.recordings (user_id);                -- Index for filtering by user
 CREATE INDEX idx_recordings_call_uuid ON core.recordings (call_uuid);            -- Index for lookup by call UUID
 CREATE INDEX idx_recordings_tags ON core.recordings USING GIN (tags);            -- GIN index for fast tag search
+CREATE INDEX idx_recordings_file_path ON core.recordings (file_path);            -- Index for lookup by file path
+CREATE INDEX idx_recordings_content_hash ON core.recordings (content_hash);      -- Index for duplicate lookups
 
 -- ===========================
 -- Table: core.time_conditions
@@ -1024,6 +1060,7 @@ CREATE TABLE core.blacklist (
 CREATE INDEX idx_blacklist_tenant_id ON core.blacklist (tenant_id);         -- Index for tenant filtering
 CREATE INDEX idx_blacklist_value ON core.blacklist (value);                 -- Index for fast lookup by number/pattern
 CREATE INDEX idx_blacklist_scope ON core.blacklist (scope);                 -- Index for filtering by scope
+CREATE INDEX idx_blacklist_tenant_source ON core.blacklist (tenant_id, source, value); -- Differential list refresh
 
 -- ===========================
 -- Table: core.call_flows
@@ -1120,6 +1157,7 @@ CREATE TABLE core.call_block (
     number_pattern TEXT NOT NULL,                                        -- Number or pattern to block (e.g., 1900*, +44*)
     block_type TEXT DEFAULT 'incoming',                                  -- Direction of block: incoming, outgoing, both
     reason TEXT,                                                         -- Description or reason for block
+    source TEXT DEFAULT 'manual',                                        -- Source of entry (manual, or the list name of an import)
     enabled BOOLEAN NOT NULL DEFAULT TRUE,                               -- TRUE if the block is active
 
     insert_date TIMESTAMPTZ NOT NULL DEFAULT NOW(),                      -- Creation timestamp
@@ -1192,6 +1230,7 @@ CREATE INDEX idx_dnd_enabled ON core.dnd (enabled);
 CREATE INDEX idx_call_block_tenant_id ON core.call_block (tenant_id);                     -- Filter blocked numbers by tenant
 CREATE INDEX idx_call_block_user_id ON core.call_block (user_id);                         -- Filter user-specific blocks
 CREATE INDEX idx_call_block_enabled ON core.call_block (enabled);                         -- Optimize active/inactive block lookups
+CREATE INDEX idx_call_block_tenant_source ON core.call_block (tenant_id, source, number_pattern); -- Differential list refresh
 
 -- Indexes for core.presence
 CREATE INDEX idx_presence_tenant_id ON core.presence (tenant_id);                         -- Presence filtering by tenant
@@ -1354,6 +1393,26 @@ CREATE UNIQUE INDEX idx_global_vars_name_tenant ON core.global_vars (name, tenan
 CREATE INDEX idx_global_vars_enabled ON core.global_vars (enabled);
 CREATE INDEX idx_global_vars_tenant_enabled ON core.global_vars (tenant_id, enabled);
 
+-- ===========================
+-- Table: core.tenant_var_maps
+-- Description: Expanded global variables per tenant ($${...} between variables resolved, tenant overrides
+--              merged on top of the global scope). Written by global_vars_refresh.py and read
+--              with a single keyed fetch per call by tenant_vars.lua. Changes to core.global_vars
+--              mark the affected maps stale; stale maps are ignored until they are rebuilt.
+-- ===========================
+CREATE TABLE core.tenant_var_maps (
+    tenant_id UUID PRIMARY KEY REFERENCES core.tenants(id) ON DELETE CASCADE, -- Tenant the map belongs to
+    vars JSONB NOT NULL DEFAULT '{}'::JSONB,                               -- Expanded variables as {"name": "value"}
+    version BIGINT NOT NULL DEFAULT 1,                                     -- Incremented each time the map changes
+    source_hash TEXT NOT NULL,                                             -- SHA-256 of the raw variables the map was built from
+    stale BOOLEAN NOT NULL DEFAULT FALSE,                                  -- TRUE once core.global_vars changed since the map was built
+
+    insert_date TIMESTAMPTZ NOT NULL DEFAULT NOW(),                       -- Created timestamp
+    insert_user UUID,                                                     -- Created by
+    update_date TIMESTAMPTZ,                                              -- Last update timestamp
+    update_user UUID                                                      -- Updated by
+);
+
 -- ============================================================================================================
 
 -- ================================================
@@ -1600,6 +1659,11 @@ BEFORE UPDATE ON core.voicemail
 FOR EACH ROW
 EXECUTE FUNCTION core.set_update_timestamp();
 
+CREATE TRIGGER trg_set_update_voicemail_messages
+BEFORE UPDATE ON core.voicemail_messages
+FOR EACH ROW
+EXECUTE FUNCTION core.set_update_timestamp();
+
 CREATE TRIGGER trg_set_update_voicemail_profiles
 BEFORE UPDATE ON core.voicemail_profiles
 FOR EACH ROW
@@ -1820,6 +1884,38 @@ BEFORE UPDATE ON core.global_vars
 FOR EACH ROW
 EXECUTE FUNCTION core.set_update_timestamp();
 
+CREATE TRIGGER trg_set_update_tenant_var_maps
+BEFORE UPDATE ON core.tenant_var_maps
+FOR EACH ROW
+EXECUTE FUNCTION core.set_update_timestamp();
+
+-- ============================================================================================================
+-- Function: core.mark_tenant_var_maps_stale()
+-- Description: Marks the variable maps affected by a change in core.global_vars as stale: every map for
+--              a global variable (tenant_id IS NULL), otherwise only the map of the variable's tenant.
+
+CREATE OR REPLACE FUNCTION core.mark_tenant_var_maps_stale()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF (TG_OP <> 'INSERT' AND OLD.tenant_id IS NULL) OR (TG_OP <> 'DELETE' AND NEW.tenant_id IS NULL) THEN
+        UPDATE core.tenant_var_maps SET stale = TRUE WHERE stale = FALSE;
+    ELSE
+        UPDATE core.tenant_var_maps SET stale = TRUE
+        WHERE stale = FALSE
+          AND tenant_id IN (
+              CASE WHEN TG_OP <> 'INSERT' THEN OLD.tenant_id END,
+              CASE WHEN TG_OP <> 'DELETE' THEN NEW.tenant_id END
+          );
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_mark_tenant_var_maps_stale
+AFTER INSERT OR UPDATE OR DELETE ON core.global_vars
+FOR EACH ROW
+EXECUTE FUNCTION core.mark_tenant_var_maps_stale();
+
 -- Create the role if it doesn't exist
 DO $$ 
 BEGIN
@@ -0,0 +1,304 @@
+-- File: ring2all_cdr_partitioning.sql
+-- Description: Converts the cdr table of the ring2all_cdr database into monthly range partitions on
+--              start_stamp and adds hourly rollup tables maintained by an incremental watermark job.
+--              Dashboards read the pre-aggregated rows, and old partitions can be detached cheaply.
+-- Usage: sudo -u postgres psql -f ring2all_cdr_partitioning.sql
+-- Prerequisites: Run after ring2all_cdr.sql. Replace $r2a_cdr_database and $r2a_cdr_user with actual values.
+--                Periodic maintenance (future partitions, rollups, detaching) is driven by
+--                migration/cdr/cdr_maintenance.py, usually from cron.
+
+-- Connect to the ring2all_cdr database
+\connect $r2a_cdr_database
+
+-- Create every object as the CDR user so later maintenance runs own the partitions they create
+SET ROLE $r2a_cdr_user;
+
+-- ============================================================================================================
+-- Table: cdr_rollup_hourly
+-- Description: Calls pre-aggregated per hour, account code and hangup cause.
+--   Sums over hangup_cause give calls per accountcode per hour; sums over accountcode give ASR/ACD
+--   per hangup cause. NULL account codes and hangup causes are stored as empty strings.
+-- ============================================================================================================
+CREATE TABLE IF NOT EXISTS cdr_rollup_hourly (
+    bucket TIMESTAMP WITH TIME ZONE NOT NULL,        -- Hour of start_stamp (date_trunc('hour', ...))
+    accountcode VARCHAR(50) NOT NULL DEFAULT '',     -- Account code of the calls ('' when not set)
+    hangup_cause VARCHAR(50) NOT NULL DEFAULT '',    -- Hangup cause of the calls ('' when not set)
+    calls BIGINT NOT NULL DEFAULT 0,                 -- Number of calls started in the hour
+    answered BIGINT NOT NULL DEFAULT 0,              -- Number of calls with an answer_stamp
+    duration BIGINT NOT NULL DEFAULT 0,              -- Sum of duration in seconds
+    billsec BIGINT NOT NULL DEFAULT 0,               -- Sum of billable seconds
+    PRIMARY KEY (bucket, accountcode, hangup_cause)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cdr_rollup_hourly_accountcode ON cdr_rollup_hourly (accountcode, bucket);
+CREATE INDEX IF NOT EXISTS idx_cdr_rollup_hourly_hangup_cause ON cdr_rollup_hourly (hangup_cause, bucket);
+
+-- ============================================================================================================
+-- Table: cdr_rollup_watermark
+-- Description: Highest cdr.id already folded into each rollup. The rollup job only reads rows above it.
+-- ============================================================================================================
+CREATE TABLE IF NOT EXISTS cdr_rollup_watermark (
+    name TEXT PRIMARY KEY,                           -- Rollup name (e.g., 'hourly')
+    last_id BIGINT NOT NULL DEFAULT 0,               -- Last cdr.id aggregated into the rollup
+    update_date TIMESTAMP WITH TIME ZONE             -- When the watermark last moved
+);
+
+INSERT INTO cdr_rollup_watermark (name, last_id) VALUES ('hourly', 0)
+ON CONFLICT (name) DO NOTHING;
+
+-- ============================================================================================================
+-- Views over the hourly rollup used by dashboards
+-- ============================================================================================================
+CREATE OR REPLACE VIEW view_cdr_hourly_by_accountcode AS
+SELECT
+    bucket,
+    accountcode,
+    SUM(calls) AS calls,
+    SUM(answered) AS answered,
+    SUM(billsec) AS billsec
+FROM cdr_rollup_hourly
+GROUP BY bucket, accountcode;
+
+CREATE OR REPLACE VIEW view_cdr_hourly_by_hangup_cause AS
+SELECT
+    bucket,
+    hangup_cause,
+    SUM(calls) AS calls,
+    SUM(answered) AS answered,
+    ROUND(100.0 * SUM(answered) / NULLIF(SUM(calls), 0), 2) AS asr,        -- Answer-seizure ratio (%)
+    ROUND(SUM(billsec)::NUMERIC / NULLIF(SUM(answered), 0), 2) AS acd       -- Average call duration (seconds)
+FROM cdr_rollup_hourly
+GROUP BY bucket, hangup_cause;
+
+-- ============================================================================================================
+-- Function: cdr_create_partition(p_month)
+-- Description: Creates the cdr_YYYYMM partition holding the month of p_month if it does not exist yet.
+--   If cdr_default already holds rows for that month (e.g., maintenance did not run in time), PostgreSQL
+--   refuses to create the partition, so those rows are moved into a standalone table first and the
+--   table is then attached as the partition. Returns the partition name.
+-- ============================================================================================================
+CREATE OR REPLACE FUNCTION cdr_create_partition(p_month DATE)
+RETURNS TEXT AS $$
+DECLARE
+    v_from DATE := date_trunc('month', p_month)::DATE;
+    v_to DATE := (date_trunc('month', p_month) + INTERVAL '1 month')::DATE;
+    v_name TEXT := 'cdr_' || to_char(p_month, 'YYYYMM');
+BEGIN
+    IF to_regclass(v_name) IS NOT NULL THEN
+        RETURN v_name;
+    END IF;
+
+    IF to_regclass('cdr_default') IS NOT NULL THEN
+        -- Block inserts into the default partition while its rows for this month are moved out
+        LOCK TABLE cdr_default IN ACCESS EXCLUSIVE MODE;
+
+        IF EXISTS (SELECT 1 FROM cdr_default WHERE start_stamp >= v_from AND start_stamp < v_to) THEN
+            EXECUTE format('CREATE TABLE %I (LIKE cdr INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', v_name);
+            EXECUTE format('INSERT INTO %I SELECT * FROM cdr_default WHERE start_stamp >= %L AND start_stamp < %L',
+                           v_name, v_from, v_to);
+            DELETE FROM cdr_default WHERE start_stamp >= v_from AND start_stamp < v_to;
+            EXECUTE format('ALTER TABLE cdr ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', v_name, v_from, v_to);
+            RETURN v_name;
+        END IF;
+    END IF;
+
+    EXECUTE format('CREATE TABLE %I PARTITION OF cdr FOR VALUES FROM (%L) TO (%L)', v_name, v_from, v_to);
+    RETURN v_name;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================================================
+-- Function: cdr_create_future_partitions(p_months_ahead)
+-- Description: Makes sure partitions exist from the current month up to p_months_ahead months ahead,
+--   so mod_cdr_pg_csv inserts never land in the default partition.
+-- ============================================================================================================
+CREATE OR REPLACE FUNCTION cdr_create_future_partitions(p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    i INTEGER;
+BEGIN
+    FOR i IN 0..p_months_ahead LOOP
+        PERFORM cdr_create_partition((date_trunc('month', NOW()) + make_interval(months => i))::DATE);
+    END LOOP;
+    RETURN p_months_ahead + 1;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================================================
+-- Function: cdr_convert_to_partitioned(p_months_ahead)
+-- Description: Replaces the plain cdr heap with a table partitioned by month on start_stamp.
+--   Existing rows are copied into per-month partitions, and rows without start_stamp go to cdr_default.
+--   The old heap is kept as cdr_legacy so it can be checked and dropped by hand.
+--   The cdr_id_seq sequence is reused, so ids keep increasing and the rollup watermark stays valid.
+--   Only the indexes used by exports and lookups are recreated, to keep inserts cheap.
+--   Does nothing when cdr is already partitioned.
+-- ============================================================================================================
+CREATE OR REPLACE FUNCTION cdr_convert_to_partitioned(p_months_ahead INTEGER DEFAULT 3)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_month DATE;
+    v_last DATE;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'cdr'::regclass) = 'p' THEN
+        RETURN FALSE;
+    END IF;
+
+    LOCK TABLE cdr IN ACCESS EXCLUSIVE MODE;
+
+    ALTER TABLE cdr RENAME TO cdr_legacy;
+    ALTER SEQUENCE cdr_id_seq OWNED BY NONE;
+
+    -- Unique constraints on a partitioned table must contain the partition key,
+    -- so uuid uniqueness is enforced together with start_stamp
+    CREATE TABLE cdr (
+        id INTEGER NOT NULL DEFAULT nextval('cdr_id_seq'),
+        local_ip_v4 INET,
+        caller_id_name VARCHAR(255),
+        caller_id_number VARCHAR(50),
+        destination_number VARCHAR(50),
+        context VARCHAR(50),
+        start_stamp TIMESTAMP WITH TIME ZONE,
+        answer_stamp TIMESTAMP WITH TIME ZONE,
+        end_stamp TIMESTAMP WITH TIME ZONE,
+        duration INTEGER CHECK (duration >= 0),
+        billsec INTEGER CHECK (billsec >= 0),
+        hangup_cause VARCHAR(50),
+        uuid UUID NOT NULL,
+        bleg_uuid UUID,
+        accountcode VARCHAR(50),
+        read_codec VARCHAR(50),
+        write_codec VARCHAR(50),
+        CONSTRAINT cdr_uuid_start_stamp_key UNIQUE (uuid, start_stamp)
+    ) PARTITION BY RANGE (start_stamp);
+
+    ALTER SEQUENCE cdr_id_seq OWNED BY cdr.id;
+
+    CREATE TABLE cdr_default PARTITION OF cdr DEFAULT;
+
+    CREATE INDEX idx_cdr_part_id ON cdr (id);                                                         -- Rollup watermark scans
+    CREATE INDEX idx_cdr_part_start_stamp ON cdr USING BRIN (start_stamp);                            -- Cheap time-range index
+    CREATE INDEX idx_cdr_part_accountcode ON cdr (accountcode, start_stamp) WHERE accountcode IS NOT NULL;
+    CREATE INDEX idx_cdr_part_destination_number ON cdr (destination_number) WHERE destination_number IS NOT NULL;
+    CREATE INDEX idx_cdr_part_caller_id_number ON cdr (caller_id_number) WHERE caller_id_number IS NOT NULL;
+
+    -- Create one partition per month present in the old table, then the months ahead
+    SELECT date_trunc('month', MIN(start_stamp))::DATE, date_trunc('month', MAX(start_stamp))::DATE
+    INTO v_month, v_last
+    FROM cdr_legacy;
+
+    WHILE v_month IS NOT NULL AND v_month <= v_last LOOP
+        PERFORM cdr_create_partition(v_month);
+        v_month := (v_month + INTERVAL '1 month')::DATE;
+    END LOOP;
+
+    PERFORM cdr_create_future_partitions(p_months_ahead);
+
+    INSERT INTO cdr SELECT * FROM cdr_legacy;
+
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================================================
+-- Function: cdr_rollup_hourly_refresh(p_batch, p_lag)
+-- Description: Folds the cdr rows above the 'hourly' watermark into cdr_rollup_hourly, p_batch ids at a time,
+--   and moves the watermark forward in the same transaction. The watermark row is locked, so concurrent runs
+--   wait instead of counting rows twice. Rows without start_stamp are bucketed by end_stamp, or skipped if both
+--   are NULL. Returns the number of rollup rows inserted or updated.
+--   mod_cdr_pg_csv writes through FreeSWITCH's per-thread database handles, so parallel hangups commit
+--   concurrently and id N+1 can be visible while N is still in flight. The watermark therefore stops below
+--   the first row that may have such a gap before it: a row written by a transaction not older than the
+--   oldest one still running (pg_snapshot_xmin), or a row that ended less than p_lag ago. Those rows are
+--   picked up by a later run.
+-- ============================================================================================================
+DROP FUNCTION IF EXISTS cdr_rollup_hourly_refresh(INTEGER);
+
+CREATE OR REPLACE FUNCTION cdr_rollup_hourly_refresh(p_batch INTEGER DEFAULT 100000,
+                                                     p_lag INTERVAL DEFAULT INTERVAL '2 minutes')
+RETURNS BIGINT AS $$
+DECLARE
+    v_last BIGINT;
+    v_max BIGINT;
+    v_upper BIGINT;
+    v_rows BIGINT;
+    v_total BIGINT := 0;
+    v_xmin_age INTEGER;
+BEGIN
+    SELECT last_id INTO v_last FROM cdr_rollup_watermark WHERE name = 'hourly' FOR UPDATE;
+
+    -- age() of the oldest running transaction; rows with a smaller or equal age may have in-flight neighbours
+    v_xmin_age := age((pg_snapshot_xmin(pg_current_snapshot())::TEXT::NUMERIC % 4294967296)::TEXT::XID);
+
+    SELECT MIN(id) - 1 INTO v_max
+    FROM cdr
+    WHERE id > v_last
+      AND (age(xmin) <= v_xmin_age OR end_stamp > NOW() - p_lag);
+
+    IF v_max IS NULL THEN
+        SELECT COALESCE(MAX(id), v_last) INTO v_max FROM cdr;
+    END IF;
+
+    WHILE v_last < v_max LOOP
+        v_upper := LEAST(v_last + p_batch, v_max);
+
+        INSERT INTO cdr_rollup_hourly AS r (bucket, accountcode, hangup_cause, calls, answered, duration, billsec)
+        SELECT
+            date_trunc('hour', COALESCE(start_stamp, end_stamp)),
+            COALESCE(accountcode, ''),
+            COALESCE(hangup_cause, ''),
+            COUNT(*),
+            COUNT(answer_stamp),
+            COALESCE(SUM(duration), 0),
+            COALESCE(SUM(billsec), 0)
+        FROM cdr
+        WHERE id > v_last AND id <= v_upper
+          AND COALESCE(start_stamp, end_stamp) IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (bucket, accountcode, hangup_cause) DO UPDATE SET
+            calls = r.calls + EXCLUDED.calls,
+            answered = r.answered + EXCLUDED.answered,
+            duration = r.duration + EXCLUDED.duration,
+            billsec = r.billsec + EXCLUDED.billsec;
+
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        v_total := v_total + v_rows;
+        v_last := v_upper;
+    END LOOP;
+
+    UPDATE cdr_rollup_watermark SET last_id = v_last, update_date = NOW() WHERE name = 'hourly';
+    RETURN v_total;
+END;
+$$ LANGUAGE plpgsql;
+
+-- ============================================================================================================
+-- Function: cdr_detach_partitions(p_keep_months)
+-- Description: Detaches monthly partitions for months older than p_keep_months months before the current one.
+--   Detached tables keep their data and can be archived or dropped; the hourly rollups are untouched.
+--   Returns the names of the detached partitions.
+-- ============================================================================================================
+CREATE OR REPLACE FUNCTION cdr_detach_partitions(p_keep_months INTEGER)
+RETURNS SETOF TEXT AS $$
+DECLARE
+    v_cutoff TEXT := 'cdr_' || to_char(date_trunc('month', NOW()) - make_interval(months => p_keep_months), 'YYYYMM');
+    v_name TEXT;
+BEGIN
+    FOR v_name IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'cdr'::regclass
+          AND c.relname ~ '^cdr_[0-9]{6}$'
+          AND c.relname < v_cutoff
+        ORDER BY c.relname
+    LOOP
+        EXECUTE format('ALTER TABLE cdr DETACH PARTITION %I', v_name);
+        RETURN NEXT v_name;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Convert the table now; on a fresh install this is instant because cdr is still empty
+SELECT cdr_convert_to_partitioned(3);
+SELECT cdr_rollup_hourly_refresh();
+
+RESET ROLE;